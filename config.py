@@ -1,5 +1,12 @@
 # config.py
 
+import ast
+import os
+import sys
+from datetime import date
+from types import MappingProxyType
+from typing import Final
+
 # ============================================================================
 # SMARTSHEET SYNCHRONIZATION CONFIGURATION
 # ============================================================================
@@ -8,7 +15,8 @@
 #
 # ARCHITECTURE OVERVIEW:
 # - source_sheets: Array of source Smartsheet configurations (multi-source support)
-# - source_sheet_id: Legacy single source (maintained for backward compatibility)
+# - source_sheet_id: Legacy single source (maintained for backward compatibility);
+#                    folded into source_sheets at import when that list is absent
 # - targets: Array of target sheet configurations with independent sync rules
 #
 # SYNC MODES:
@@ -27,27 +35,90 @@
 # - String values: Column names resolved at runtime (recommended for flexibility)
 # - The script dynamically resolves column names to IDs during execution
 #
+# WRITE BATCHING (optional):
+# - batch_size: Rows per add/update request for this target (1-500, default 500).
+#               Smaller batches bound the cost of retrying a failed request.
+#
+# CONTENT HASH (update mode, optional):
+# - content_hash_column: Column ID or name of a (hidden) text column that stores
+#                        a digest of the mapped source values. Rows whose digest
+#                        matches skip the cell-by-cell comparison. Manual edits to
+#                        mapped target cells are not detected while the digest matches.
+#
 # GENERATED COLUMNS:
 # - week_ending_date: Calculated field for weekly snapshot grouping
 # - week_number: ISO week number for temporal indexing and reporting
 #
+# DERIVED VALUES:
+# - Date strings are parsed once at import (see bottom of this file) and the
+#   parsed dates are stored on each target as '_sync_start_date' and
+#   '_sync_end_date' (None when the setting is absent)
+# - SHEET_CONFIG is frozen read-only after import; treat it as immutable
+#
 # HISTORICAL BACKFILL CONFIGURATION:
 # - ENABLE_HISTORICAL_BACKFILL: Set to True to fill missing historical snapshot rows
 #                                Set to False after initial backfill is complete
+#                                (env var ENABLE_HISTORICAL_BACKFILL overrides it)
 # - HISTORICAL_BACKFILL_START: Start date for scanning historical weeks
 #                               Scans all weeks from this date to current week
+#
+# CONCURRENCY:
+# - MAX_PARALLEL_TARGETS: How many targets are synced at the same time
+#                         (env var MAX_PARALLEL_TARGETS overrides it; 1 = serial)
 # ============================================================================
 
+def _env_flag(name, default):
+    """
+    Reads a true/false environment variable. Unset or empty (e.g. an unset workflow
+    variable) means the default; anything unrecognized stops the run instead of
+    silently counting as false.
+    """
+    value = os.environ.get(name, '').strip().lower()
+    if not value:
+        return default
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"{name}={os.environ[name]!r} is not a true/false value")
+
+
+def _env_int(name, default):
+    """
+    Reads an integer environment variable. Unset or empty means the default;
+    anything else that is not an integer stops the run with a clear error.
+    """
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name}={os.environ[name]!r} is not an integer") from None
+
+
 # Historical Backfill Settings
-ENABLE_HISTORICAL_BACKFILL = True
+# The ENABLE_HISTORICAL_BACKFILL environment variable ('true'/'false') overrides
+# the default for a single run without editing this file
+ENABLE_HISTORICAL_BACKFILL: Final[bool] = _env_flag('ENABLE_HISTORICAL_BACKFILL', default=True)
 HISTORICAL_BACKFILL_START = '2025-06-15'
 
+# Targets are independent sheets, so their syncs can overlap their network
+# waits. Kept small to stay well inside Smartsheet's 300 requests/minute limit.
+MAX_PARALLEL_TARGETS: Final[int] = max(1, _env_int('MAX_PARALLEL_TARGETS', default=4))
+
+# Primary source identifiers - referenced by the source list, the legacy
+# source_sheet_id key and every target mapping below. Defined once so the
+# targets cannot drift out of sync with the source sheet.
+PRIMARY_SOURCE_SHEET_ID = 3733355007790980
+PRIMARY_WORK_REQUEST_COLUMN_ID = 6922793410842500
+
 SHEET_CONFIG = {
     'source_sheets': [
         {
-            'id': 3733355007790980,
+            'id': PRIMARY_SOURCE_SHEET_ID,
             'description': 'Primary Master Sheet',
-            'work_request_column_id': 6922793410842500,
+            'work_request_column_id': PRIMARY_WORK_REQUEST_COLUMN_ID,
         },
         {
             'id': 6329947502104452,
@@ -56,7 +127,7 @@ SHEET_CONFIG = {
         },
     ],
     # Legacy support: keep source_sheet_id for update mode targets
-    'source_sheet_id': 3733355007790980,
+    'source_sheet_id': PRIMARY_SOURCE_SHEET_ID,
     'targets': [
         # ====================================================================
         # UPDATE MODE TARGETS
@@ -68,7 +139,7 @@ SHEET_CONFIG = {
             'sync_mode': 'update',
             'tracking_column_name': 'Source_Row_ID',
             'column_id_mapping': {
-                6922793410842500: 5180541294563204,
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 5180541294563204,
             },
             # NOTE: To enable full snapshotting capabilities, add a 'generated_columns'
             # section here similar to the snapshot target sheet configurations below.
@@ -79,7 +150,7 @@ SHEET_CONFIG = {
             'sync_mode': 'update',
             'tracking_column_name': 'Source_Row_ID',
             'column_id_mapping': {
-                6922793410842500: 4526106084069252,
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 4526106084069252,
             }
         },
         {
@@ -112,7 +183,7 @@ SHEET_CONFIG = {
             'tracking_column_name': 'Source_Row_ID',
             'column_id_mapping': {
                 # Map source "Work Request #" to target "Work Request #"
-                6922793410842500: 5243793911271300,
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 5243793911271300,
             },
             # Columns populated by script-generated calculated values
             'generated_columns': {
@@ -132,7 +203,7 @@ SHEET_CONFIG = {
             'tracking_column_name': 'Source_Row_ID',
             'column_id_mapping': {
                 # Map source "Work Request #" to target "Work Request #"
-                6922793410842500: 6811704037691268,
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 6811704037691268,
             },
             # Columns populated by script-generated calculated values
             'generated_columns': {
@@ -153,7 +224,7 @@ SHEET_CONFIG = {
             'column_id_mapping': {
                 # Map source "Work Request #" to target column by name
                 # Runtime resolution allows for greater flexibility
-                6922793410842500: 'Work Request #',
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 'Work Request #',
             },
             # Columns populated by script-generated calculated values (resolved by name)
             'generated_columns': {
@@ -173,7 +244,7 @@ SHEET_CONFIG = {
             'column_id_mapping': {
                 # Map source "Work Request #" to target column by name
                 # Runtime resolution allows for greater flexibility
-                6922793410842500: 'Work Request #',
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 'Work Request #',
             },
             # Columns populated by script-generated calculated values (resolved by name)
             'generated_columns': {
@@ -193,7 +264,7 @@ SHEET_CONFIG = {
             'column_id_mapping': {
                 # Map source "Work Request #" to target "Work Request #"
                 # Using column name for runtime resolution (recommended pattern)
-                6922793410842500: 'Work Request #',
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 'Work Request #',
             },
             # Columns populated by script-generated calculated values (resolved by name)
             # These values are computed during sync execution based on temporal logic
@@ -215,7 +286,7 @@ SHEET_CONFIG = {
             'column_id_mapping': {
                 # Map source "Work Request #" to target "Work Request #"
                 # Using column name for runtime resolution (recommended pattern)
-                6922793410842500: 'Work Request #',
+                PRIMARY_WORK_REQUEST_COLUMN_ID: 'Work Request #',
             },
             # Columns populated by script-generated calculated values (resolved by name)
             # These values are computed during sync execution based on temporal logic
@@ -230,3 +301,198 @@ SHEET_CONFIG = {
         },
     ]
 }
+
+
+# ============================================================================
+# DERIVED VALUES
+# ============================================================================
+# Everything below is computed once at import. Do not edit these directly -
+# change the settings and the SHEET_CONFIG literal above instead.
+#
+# 1. A legacy 'source_sheet_id'-only config is normalized to 'source_sheets'
+# 2. SHEET_CONFIG is validated; import fails with a ValueError on bad IDs,
+#    duplicate dict keys or unparseable dates
+# 3. Date strings are parsed into datetime.date objects
+# 4. SHEET_CONFIG is frozen: dicts become read-only MappingProxyType views,
+#    lists become tuples and strings are interned, so the config can be
+#    shared between worker threads without defensive copies
+# 5. SOURCE_COLUMN_IDS collects the source columns the targets read
+# ============================================================================
+
+
+def _parse_config_date(value):
+    """Parses an optional 'YYYY-MM-DD' config value into a date (None passes through)."""
+    return date.fromisoformat(value) if value else None
+
+
+def _is_smartsheet_id(value):
+    """Smartsheet sheet and column IDs are 15-16 digit integers."""
+    return isinstance(value, int) and not isinstance(value, bool) and 10 ** 14 <= value < 10 ** 16
+
+
+def _is_column_ref(value):
+    """Target column references may be a column ID or a column title resolved at runtime."""
+    return _is_smartsheet_id(value) or (isinstance(value, str) and value.strip() != '')
+
+
+def _literal_key_value(key):
+    """
+    Evaluates a dict-literal key node the way Python will: literals directly and
+    names (e.g. PRIMARY_WORK_REQUEST_COLUMN_ID) through this module's globals.
+    Other expressions fall back to their source text.
+    """
+    if isinstance(key, ast.Name) and key.id in globals():
+        return globals()[key.id]
+    try:
+        return ast.literal_eval(key)
+    except ValueError:
+        return ('<expression>', ast.unparse(key))
+
+
+def _find_duplicate_literal_keys():
+    """
+    Returns (line_number, key) pairs for dict literals in SHEET_CONFIG that repeat a key.
+    A Python dict literal silently keeps the last duplicate, so this is checked
+    against the source rather than the evaluated SHEET_CONFIG. Keys are compared by
+    value, so a named ID constant and the same ID written as a number collide.
+    """
+    with open(__file__, encoding='utf-8') as config_file:
+        tree = ast.parse(config_file.read())
+    config_literals = [node.value for node in tree.body
+                       if isinstance(node, ast.Assign)
+                       and any(isinstance(name, ast.Name) and name.id == 'SHEET_CONFIG' for name in node.targets)
+                       and isinstance(node.value, ast.Dict)]
+    duplicates = []
+    for node in (node for literal in config_literals for node in ast.walk(literal)):
+        if not isinstance(node, ast.Dict):
+            continue
+        seen_keys = set()
+        for key in node.keys:
+            if key is None:  # ** unpacking
+                continue
+            key_value = _literal_key_value(key)
+            if key_value in seen_keys:
+                duplicates.append((key.lineno, ast.unparse(key)))
+            seen_keys.add(key_value)
+    return duplicates
+
+
+def _normalize_sources(config):
+    """
+    Folds the legacy single 'source_sheet_id' form into the 'source_sheets' list
+    so the sync only ever has to handle one source schema.
+    """
+    if not config.get('source_sheets') and config.get('source_sheet_id'):
+        config['source_sheets'] = [{
+            'id': config['source_sheet_id'],
+            'description': 'Legacy Source Sheet',
+            'work_request_column_id': PRIMARY_WORK_REQUEST_COLUMN_ID,
+        }]
+
+
+def _validate_config(config):
+    """
+    Checks SHEET_CONFIG for mistakes that would otherwise only surface after
+    Smartsheet API round trips (mistyped IDs, overwritten mapping keys, bad dates).
+    
+    Raises:
+        ValueError: listing every problem found
+    """
+    errors = [f"line {line}: duplicate key {key} in dict literal" for line, key in _find_duplicate_literal_keys()]
+
+    for source in config.get('source_sheets', ()):
+        if not _is_smartsheet_id(source.get('id')):
+            errors.append(f"source sheet {source.get('id')!r}: 'id' is not a valid Smartsheet ID")
+        if not _is_smartsheet_id(source.get('work_request_column_id')):
+            errors.append(f"source sheet {source.get('id')!r}: 'work_request_column_id' is not a valid Smartsheet ID")
+
+    target_ids = [target.get('id') for target in config['targets']]
+    for target_id in sorted({target_id for target_id in target_ids if target_ids.count(target_id) > 1}, key=repr):
+        errors.append(f"target {target_id!r}: listed more than once (targets are synced in parallel and must be distinct sheets)")
+
+    for target in config['targets']:
+        label = f"target {target.get('id')!r}"
+        if not _is_smartsheet_id(target.get('id')):
+            errors.append(f"{label}: 'id' is not a valid Smartsheet ID")
+        sync_mode = target.get('sync_mode', 'update')
+        if sync_mode not in ('update', 'snapshot'):
+            errors.append(f"{label}: unknown sync_mode {sync_mode!r}")
+        for source_col, target_col in target.get('column_id_mapping', {}).items():
+            if not _is_smartsheet_id(source_col):
+                errors.append(f"{label}: column_id_mapping key {source_col!r} is not a valid Smartsheet column ID")
+            if not _is_column_ref(target_col):
+                errors.append(f"{label}: column_id_mapping value {target_col!r} is not a column ID or name")
+        for name, column_ref in target.get('generated_columns', {}).items():
+            if not _is_column_ref(column_ref):
+                errors.append(f"{label}: generated column {name!r} has invalid reference {column_ref!r}")
+        # Every value the sync writes needs its own cell; a column configured for two
+        # of them would have one value silently overwrite the other. References are
+        # compared as written, so a name and an ID for the same column are not caught.
+        mapped_column_refs = list(target.get('column_id_mapping', {}).values())
+        if target.get('target_work_request_column') not in mapped_column_refs:
+            # Usually repeats the mapped Work Request # column, which is the same write
+            mapped_column_refs.append(target.get('target_work_request_column'))
+        written_column_refs = [
+            target.get('tracking_column_name'),
+            *target.get('generated_columns', {}).values(),
+            target.get('content_hash_column'),
+            *mapped_column_refs,
+        ]
+        for column_ref in sorted({ref for ref in written_column_refs if ref is not None and written_column_refs.count(ref) > 1}, key=repr):
+            errors.append(f"{label}: column {column_ref!r} is written by more than one of tracking_column_name/"
+                          f"generated_columns/content_hash_column/column_id_mapping/target_work_request_column")
+        if sync_mode == 'snapshot' and 'week_ending_date' not in target.get('generated_columns', {}):
+            errors.append(f"{label}: snapshot targets require generated_columns['week_ending_date']")
+        if 'batch_size' in target:
+            batch_size = target['batch_size']
+            if not isinstance(batch_size, int) or isinstance(batch_size, bool) or not 1 <= batch_size <= 500:
+                errors.append(f"{label}: batch_size {batch_size!r} must be an integer between 1 and 500")
+        if 'content_hash_column' in target:
+            if sync_mode != 'update':
+                errors.append(f"{label}: content_hash_column is only supported for update targets")
+            elif not _is_column_ref(target['content_hash_column']):
+                errors.append(f"{label}: content_hash_column {target['content_hash_column']!r} is not a column ID or name")
+        for date_key in ('sync_start_date', 'sync_end_date'):
+            try:
+                _parse_config_date(target.get(date_key))
+            except (TypeError, ValueError):
+                errors.append(f"{label}: {date_key} {target.get(date_key)!r} is not a YYYY-MM-DD date")
+
+    if errors:
+        raise ValueError("Invalid SHEET_CONFIG:\n  - " + "\n  - ".join(errors))
+
+
+def _parse_target_dates(config):
+    """Stores each target's parsed sync dates as '_sync_start_date' and '_sync_end_date'."""
+    for target in config['targets']:
+        target['_sync_start_date'] = _parse_config_date(target.get('sync_start_date'))
+        target['_sync_end_date'] = _parse_config_date(target.get('sync_end_date'))
+
+
+def _freeze(value):
+    """Recursively converts dicts to MappingProxyType, lists to tuples and interns strings."""
+    if isinstance(value, dict):
+        return MappingProxyType({_freeze(key): _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+_normalize_sources(SHEET_CONFIG)
+_validate_config(SHEET_CONFIG)
+
+HISTORICAL_BACKFILL_START_DATE = _parse_config_date(HISTORICAL_BACKFILL_START)
+
+_parse_target_dates(SHEET_CONFIG)
+
+SHEET_CONFIG = _freeze(SHEET_CONFIG)
+
+# Every source column any target reads (mapping keys plus each source's Work
+# Request # column). Cells outside this set are never looked at by the sync.
+SOURCE_COLUMN_IDS = frozenset(
+    [source['work_request_column_id'] for source in SHEET_CONFIG.get('source_sheets', ())]
+    + [source_col for target in SHEET_CONFIG['targets'] for source_col in target['column_id_mapping']]
+)
+
@@ -1,25 +1,142 @@
 # smartsheet_sync.py
 
 import os
+import collections
+import functools
+import hashlib
+import logging
+import threading
+import time
 import smartsheet
-from config import SHEET_CONFIG, ENABLE_HISTORICAL_BACKFILL, HISTORICAL_BACKFILL_START
-from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import SHEET_CONFIG, ENABLE_HISTORICAL_BACKFILL, HISTORICAL_BACKFILL_START_DATE, MAX_PARALLEL_TARGETS, SOURCE_COLUMN_IDS
+from datetime import date, timedelta
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+# Smartsheet rejects add/update row requests larger than this
+MAX_ROWS_PER_REQUEST = 500
+
+# An API call that still fails after the SDK's own retries is retried this many
+# more times with exponential backoff, so one transient error does not drop a target.
+# The SDK only retries errors it marks should_retry, and gives up after 30s; the
+# extra 5+10+20s deliberately outlasts Smartsheet's per-minute rate-limit window.
+API_RETRY_ATTEMPTS = 3
+API_RETRY_BASE_DELAY_SECONDS = 5
+# Rate limiting (429 / error 4003) and scheduled maintenance (4001) reject a request
+# before it is applied, so these are the only errors that are safe to resend for
+# non-idempotent calls such as add_rows
+RATE_LIMIT_STATUS_CODE = 429
+NOT_APPLIED_ERROR_CODES = (4001, 4003)
+# Server errors, timeouts (4002) and concurrent-update conflicts (4004) may arrive
+# after the request was applied, so they are only retried for idempotent calls
+# (reads, update_rows, delete_rows)
+SERVER_ERROR_STATUS_CODES = (500, 502, 503, 504)
+
+# Cells that were never given a value are left out of get_sheet responses; they
+# read as None through get_row_values() either way, so only the payload shrinks
+SHEET_FETCH_EXCLUDE = ['nonexistentCells']
+
 def get_current_week_ending_date():
     today = date.today()
     days_until_sunday = (6 - today.weekday() + 7) % 7
     return today + timedelta(days=days_until_sunday)
 
-def calculate_week_number(current_wed, start_date_str='2025-06-15'):
-    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+# Sunday that starts project week 0
+PROJECT_WEEK_START = date(2025, 6, 15)
+
+def calculate_week_number(current_wed, start_date=PROJECT_WEEK_START):
     return (current_wed - start_date).days // 7
 
-def get_column_map_by_name(sheet):
-    return {column.title: column.id for column in sheet.columns}
+@functools.lru_cache(maxsize=None)
+def get_historical_week_table(start_date, current_wed, end_date=None):
+    """
+    Returns the historical week ending dates (Sundays) for a backfill window.
+    Covers every Sunday from the first Sunday on or after start_date up to, but not
+    including, current_wed, stopping after end_date when one is given.
+    
+    Snapshot targets sharing a start date share one cached table, so the
+    week strings and project week numbers are computed once per run.
+    
+    Returns:
+        A tuple of (week_ending_date, 'YYYY-MM-DD' string, project week number) tuples
+    """
+    days_until_sunday = (6 - start_date.weekday() + 7) % 7
+    week_date = start_date + timedelta(days=days_until_sunday)
+    week_table = []
+    while week_date < current_wed and (end_date is None or week_date <= end_date):
+        week_table.append((week_date, week_date.strftime('%Y-%m-%d'), calculate_week_number(week_date)))
+        week_date += timedelta(days=7)
+    return tuple(week_table)
+
+# Column definitions fetched by get_sheet_column_map: {sheet_id: (expires_at, column_map)}.
+# Column layouts rarely change, so a short TTL bounds how long a rename goes unseen.
+COLUMN_CACHE_TTL_SECONDS = 300
+_sheet_column_cache = {}
+
+def get_sheet_column_map(smart, sheet_id):
+    """
+    Fetches only a sheet's column definitions (no row data) and returns {title: id}.
+    Lets callers resolve column names before deciding which columns to download.
+    Results are cached per sheet for COLUMN_CACHE_TTL_SECONDS and shared between
+    target threads, so the returned mapping is read-only.
+    """
+    cached = _sheet_column_cache.get(sheet_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    columns = call_with_retry(f"Loading columns of sheet {sheet_id}", smart.Sheets.get_columns, sheet_id, include_all=True).data
+    column_map = MappingProxyType({column.title: column.id for column in columns})
+    _sheet_column_cache[sheet_id] = (time.monotonic() + COLUMN_CACHE_TTL_SECONDS, column_map)
+    return column_map
+
+def invalidate_sheet_column_map(sheet_id):
+    """Drops the cached column definitions of a sheet, e.g. after a failed sync."""
+    _sheet_column_cache.pop(sheet_id, None)
+
+def get_row_values(row):
+    """
+    Indexes a row's cells once as {column_id: value}.
+    Row.get_column() scans row.cells linearly on every call, so any row that is
+    read more than once should be looked up through this map instead.
+    """
+    return {cell.column_id: cell.value for cell in row.cells}
+
+def build_cell(column_id, value):
+    """
+    Builds a raw cell payload for add_rows/update_rows.
+    Plain dicts skip the SDK model's per-attribute validation; a None value is
+    left out, exactly as the SDK's Cell model would serialize it.
+    """
+    if value is None:
+        return {'columnId': column_id}
+    return {'columnId': column_id, 'value': value}
+
+def canonicalize_value(value):
+    """
+    Reduces a cell value to the form used for change detection, so values that
+    only differ in representation (None vs "", surrounding whitespace, float
+    noise) are not reported as updates.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+def compute_content_hash(source_values, column_mapping):
+    """
+    Returns a short digest of the mapped source values of a row, used to skip
+    the per-cell comparison for rows whose source data has not changed.
+    """
+    mapped_values = tuple(canonicalize_value(source_values.get(src_id)) for src_id, _ in column_mapping)
+    return hashlib.blake2b(repr(mapped_values).encode('utf-8'), digest_size=8).hexdigest()
 
 def resolve_column_id(column_ref, column_map):
     """
@@ -32,6 +149,19 @@ def resolve_column_id(column_ref, column_map):
         return column_map.get(column_ref)
     return None
 
+def resolve_target_work_request_column(target_config, column_map):
+    """
+    Resolves the target "Work Request #" column for a snapshot target once per sync.
+    Uses 'target_work_request_column' when configured, otherwise falls back to the
+    target column of the first entry in column_id_mapping.
+    """
+    explicit_column = target_config.get('target_work_request_column')
+    if explicit_column is not None:
+        return resolve_column_id(explicit_column, column_map)
+    for src_col, tgt_col in target_config['column_id_mapping'].items():
+        return resolve_column_id(tgt_col, column_map)
+    return None
+
 def normalize_tracking_id(tracking_value):
     """
     Normalizes tracking ID to ensure consistent string comparison.
@@ -45,6 +175,7 @@ def generate_composite_tracking_id(source_sheet_id, row_id):
     """
     Generates a composite tracking ID for multi-source scenarios.
     Format: {source_sheet_id}_{row_id}
+    The result is already a string, so it needs no normalize_tracking_id call.
     """
     return f"{source_sheet_id}_{row_id}"
 
@@ -103,42 +234,124 @@ def is_not_found_error(exception):
         return False
     return getattr(result_obj, 'code', None) == 1006
 
-def load_all_source_data(smart, source_sheets_config):
+def is_retryable_error(exception, idempotent=True):
     """
-    Loads data from all configured source sheets.
-    Returns a list of tuples: (source_sheet_object, source_config)
+    Checks if a Smartsheet API exception is transient (rate limiting, server
+    errors, concurrent modification) and the request can safely be sent again.
+    
+    Args:
+        exception: A smartsheet.exceptions.ApiError exception
+        idempotent: Whether sending the request twice has the same effect as once.
+            Non-idempotent requests are only retried on errors that guarantee the
+            first attempt was not applied (rate limiting, maintenance).
+        
+    Returns:
+        bool: True if the request may succeed when retried, False otherwise
     """
-    source_data = []
-    for source_config in source_sheets_config:
-        source_sheet_id = source_config['id']
+    error_obj = getattr(exception, 'error', None)
+    if error_obj is None:
+        return False
+    result_obj = getattr(error_obj, 'result', None)
+    if result_obj is None:
+        return False
+    status_code = getattr(result_obj, 'status_code', None)
+    if status_code == RATE_LIMIT_STATUS_CODE or getattr(result_obj, 'code', None) in NOT_APPLIED_ERROR_CODES:
+        return True
+    if not idempotent:
+        # should_retry also covers timeouts (4002), which may have been applied
+        return False
+    if getattr(result_obj, 'should_retry', False):
+        return True
+    return status_code in SERVER_ERROR_STATUS_CODES
+
+def call_with_retry(description, api_call, *args, idempotent=True, **kwargs):
+    """
+    Calls a Smartsheet SDK method, retrying transient API errors with exponential backoff.
+    
+    Args:
+        description: What is being sent, used in the retry log message
+        api_call: Bound SDK method, e.g. smart.Sheets.get_sheet
+        *args, **kwargs: Passed through to api_call
+        idempotent: False for calls that must not be applied twice (add_rows);
+            see is_retryable_error
+        
+    Returns:
+        Whatever api_call returns
+    """
+    for attempt in range(API_RETRY_ATTEMPTS + 1):
         try:
-            source_sheet = smart.Sheets.get_sheet(source_sheet_id)
-            print(f"  Loaded source sheet '{source_sheet.name}' (ID: {source_sheet_id}) with {len(source_sheet.rows)} rows")
-            source_data.append((source_sheet, source_config))
-        except Exception as e:
-            print(f"  ERROR: Could not load source sheet {source_sheet_id}: {e}")
-    return source_data
+            return api_call(*args, **kwargs)
+        except smartsheet.exceptions.ApiError as e:
+            if attempt == API_RETRY_ATTEMPTS or not is_retryable_error(e, idempotent):
+                raise
+            delay = API_RETRY_BASE_DELAY_SECONDS * 2 ** attempt
+            logger.warning(f"  {description} failed with a transient error ({e}). Retrying in {delay}s...")
+            time.sleep(delay)
 
-def get_all_source_rows(source_data_list):
+def load_source_sheet(smart, source_config):
+    """
+    Loads one source sheet. Returns None (after logging the error) if it cannot be loaded.
+    Only the columns some target reads (SOURCE_COLUMN_IDS) are downloaded.
+    """
+    source_sheet_id = source_config['id']
+    try:
+        # SOURCE_COLUMN_IDS spans every source, and the API rejects column IDs that
+        # are not on the sheet, so keep only this sheet's own columns
+        existing_col_ids = set(get_sheet_column_map(smart, source_sheet_id).values())
+        needed_col_ids = [col_id for col_id in SOURCE_COLUMN_IDS if col_id in existing_col_ids] or None
+        source_sheet = call_with_retry(f"Loading source sheet {source_sheet_id}", smart.Sheets.get_sheet,
+                                       source_sheet_id, column_ids=needed_col_ids, exclude=SHEET_FETCH_EXCLUDE)
+        logger.info(f"  Loaded source sheet '{source_sheet.name}' (ID: {source_sheet_id}) with {len(source_sheet.rows)} rows")
+        return source_sheet
+    except Exception as e:
+        logger.error(f"  ERROR: Could not load source sheet {source_sheet_id}: {e}")
+        return None
+
+def load_all_source_data(smart, source_sheets_config):
+    """
+    Loads data from all configured source sheets.
+    The sheets are independent GETs, so they are fetched concurrently.
+    Returns a list of tuples: (source_sheet_object, source_config), in config order
+    """
+    max_workers = max(1, min(MAX_PARALLEL_TARGETS, len(source_sheets_config)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        source_sheets = list(executor.map(lambda source_config: load_source_sheet(smart, source_config), source_sheets_config))
+    return [(source_sheet, source_config)
+            for source_sheet, source_config in zip(source_sheets, source_sheets_config)
+            if source_sheet is not None]
+
+def get_all_source_rows(source_data_list, column_ids=None):
     """
     Collects all source rows from multiple source sheets with proper tracking IDs.
-    Returns a list of tuples: (source_row, composite_tracking_id, source_config)
+    Returns a list of tuples: (source_row, composite_tracking_id, source_config, row_values)
+    where row_values is the row's {column_id: value} map, limited to column_ids when
+    given. Built once per run and shared by every target, so source cells are
+    indexed only once.
     """
     all_rows = []
     for source_sheet, source_config in source_data_list:
         source_sheet_id = source_config['id']
         for row in source_sheet.rows:
             composite_id = generate_composite_tracking_id(source_sheet_id, row.id)
-            all_rows.append((row, composite_id, source_config))
+            if column_ids is None:
+                row_values = get_row_values(row)
+            else:
+                row_values = {cell.column_id: cell.value for cell in row.cells if cell.column_id in column_ids}
+            all_rows.append((row, composite_id, source_config, row_values))
     return all_rows
 
-def get_target_row_map_for_update(smart, sheet, tracking_column_id):
-    target_map = {}
-    for row in sheet.rows:
-        tracking_cell = row.get_column(tracking_column_id)
-        if tracking_cell and tracking_cell.value:
-            target_map[tracking_cell.value] = row
-    return target_map
+def get_target_row_map_for_update(sheet, tracking_column_id, needed_column_ids):
+    """
+    Maps tracking value -> (row_id, {column_id: value}) for the target rows.
+    Only the columns in needed_column_ids are kept, so the SDK Row objects can be
+    released once the map is built.
+    """
+    indexed_rows = ((row.id, get_row_values(row)) for row in sheet.rows)
+    return {
+        row_values[tracking_column_id]: (row_id, {column_id: row_values.get(column_id) for column_id in needed_column_ids})
+        for row_id, row_values in indexed_rows
+        if row_values.get(tracking_column_id)
+    }
 
 def delete_duplicate_rows(smart, sheet_id, duplicate_row_ids):
     """
@@ -153,7 +366,7 @@ def delete_duplicate_rows(smart, sheet_id, duplicate_row_ids):
     if not duplicate_row_ids:
         return
     
-    print(f"Deleting {len(duplicate_row_ids)} duplicate rows...")
+    logger.info(f"Deleting {len(duplicate_row_ids)} duplicate rows...")
     
     # Process in batches of 100 to avoid API limits
     batch_size = 100
@@ -164,43 +377,69 @@ def delete_duplicate_rows(smart, sheet_id, duplicate_row_ids):
     for i in range(0, len(duplicate_row_ids), batch_size):
         batch = duplicate_row_ids[i:i + batch_size]
         batch_num = (i // batch_size) + 1
-        print(f"  Deleting batch {batch_num}/{total_batches} ({len(batch)} rows)...")
+        logger.info(f"  Deleting batch {batch_num}/{total_batches} ({len(batch)} rows)...")
         try:
-            smart.Sheets.delete_rows(sheet_id, batch)
+            # A resent delete that already went through fails with 1006, which is
+            # handled below, so server errors are safe to retry here
+            call_with_retry(f"Delete batch {batch_num}", smart.Sheets.delete_rows, sheet_id, batch)
             deleted_count += len(batch)
-            print(f"  Batch {batch_num} deleted successfully.")
+            logger.info(f"  Batch {batch_num} deleted successfully.")
         except smartsheet.exceptions.ApiError as e:
             # Error code 1006 means "Not Found" - rows may have been deleted already
             if is_not_found_error(e):
-                print(f"  Batch {batch_num}: Some rows not found (already deleted). Retrying individually...")
+                logger.info(f"  Batch {batch_num}: Some rows not found (already deleted). Retrying individually...")
                 # Try deleting rows one by one to salvage what we can
                 for row_id in batch:
                     try:
-                        smart.Sheets.delete_rows(sheet_id, [row_id])
+                        call_with_retry(f"Deleting row {row_id}", smart.Sheets.delete_rows, sheet_id, [row_id])
                         deleted_count += 1
                     except smartsheet.exceptions.ApiError as inner_e:
                         if is_not_found_error(inner_e):
                             skipped_count += 1
-                            print(f"    Row {row_id} not found (already deleted), skipping.")
+                            logger.debug("    Row %s not found (already deleted), skipping.", row_id)
                         else:
                             raise inner_e
             else:
                 raise e
     
     if skipped_count > 0:
-        print(f"Completed: Deleted {deleted_count} rows, skipped {skipped_count} rows (already deleted).")
+        logger.info(f"Completed: Deleted {deleted_count} rows, skipped {skipped_count} rows (already deleted).")
     else:
-        print(f"Successfully deleted all {deleted_count} duplicate rows.")
+        logger.info(f"Successfully deleted all {deleted_count} duplicate rows.")
+
+def write_rows_in_batches(write_rows, sheet_id, rows, batch_size=MAX_ROWS_PER_REQUEST, idempotent=True):
+    """
+    Sends rows to Smartsheet in batches of at most batch_size rows.
+    The API rejects add/update requests above 500 rows, so large backfills
+    must be split up.
+    
+    Args:
+        write_rows: Bound SDK method, e.g. smart.Sheets.add_rows or smart.Sheets.update_rows
+        sheet_id: Target sheet ID
+        rows: List of row payloads
+        batch_size: Maximum rows per request
+        idempotent: Pass False for add_rows: a batch that hit a server error may
+            already have been inserted, and resending it would duplicate the rows
+    """
+    # Batches are sent one after another: concurrent writes to the same sheet
+    # conflict with each other on the Smartsheet side (error 4004)
+    total_batches = (len(rows) + batch_size - 1) // batch_size
+    
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        batch_num = (i // batch_size) + 1
+        logger.info(f"  Processing batch {batch_num}/{total_batches} ({len(batch)} rows)...")
+        call_with_retry(f"Batch {batch_num}", write_rows, sheet_id, batch, idempotent=idempotent)
+        logger.info(f"  Batch {batch_num} completed successfully.")
 
-def get_snapshot_metadata(smart, sheet, tracking_col_id, week_end_col_id, week_num_col_id, work_request_col_id=None):
+def get_snapshot_metadata(sheet, tracking_col_id, week_end_col_id, week_num_col_id, work_request_col_id=None):
     """
     Scans a snapshot sheet to gather metadata.
     Returns:
-    1. A map of (normalized_source_id, date) -> target_row_object for update/enrichment checks.
+    1. A map of week ending date -> {normalized_source_id: (row_id, work_request_value)} for update/enrichment checks.
     2. A list of rows that need their week number backfilled.
-    3. A set of unique week ending dates already present in the sheet.
-    4. A list of duplicate row IDs to delete.
-    5. A map of (work_request_value, week_ending_date) -> target_row for cross-source deduplication.
+    3. A list of duplicate row IDs to delete.
+    4. A map of (work_request_value, week_ending_date) -> row_id for cross-source deduplication.
     
     Also detects and marks for deletion:
     - Old-format tracking IDs that have corresponding new composite tracking IDs
@@ -208,7 +447,6 @@ def get_snapshot_metadata(smart, sheet, tracking_col_id, week_end_col_id, week_n
     """
     snapshot_map = {}
     rows_to_backfill = []
-    existing_week_dates = set()
     duplicate_row_ids_set = set()  # Use set for O(1) lookup performance
     
     # Track old-format entries by (row_id, week_end_date) -> row_id for migration detection
@@ -219,84 +457,85 @@ def get_snapshot_metadata(smart, sheet, tracking_col_id, week_end_col_id, week_n
     # Cross-source deduplication: track (work_request_value, week_ending_date) -> first row seen
     work_request_week_map = {}
     
-    # We need all columns to check for blank cells, so we fetch the full sheet data here.
-    for row in smart.Sheets.get_sheet(sheet.id, include=['data']).rows:
-        tracking_cell = row.get_column(tracking_col_id)
-        week_end_cell = row.get_column(week_end_col_id)
-        week_num_cell = row.get_column(week_num_col_id) if week_num_col_id else None
-        work_request_cell = row.get_column(work_request_col_id) if work_request_col_id else None
-
-        if tracking_cell and tracking_cell.value and week_end_cell and week_end_cell.value:
+    # The caller already loaded the sheet with every column read here, so blank
+    # week-number cells can be detected from it without fetching the sheet again.
+    # Only row IDs and values are kept, not the SDK row objects.
+    for row in sheet.rows:
+        row_values = get_row_values(row)
+        tracking_value = row_values.get(tracking_col_id)
+        week_end_value = row_values.get(week_end_col_id)
+        raw_work_request_value = row_values.get(work_request_col_id) if work_request_col_id else None
+
+        if tracking_value and week_end_value:
             # Normalize tracking ID to string for consistent comparison
-            normalized_tracking_id = normalize_tracking_id(tracking_cell.value)
-            composite_key = (normalized_tracking_id, week_end_cell.value)
+            normalized_tracking_id = normalize_tracking_id(tracking_value)
+            week_entries = snapshot_map.setdefault(week_end_value, {})
             
-            # Check if this composite key already exists (duplicate detection by tracking ID)
-            if composite_key in snapshot_map:
+            # Check if this tracking ID already exists for the week (duplicate detection by tracking ID)
+            if normalized_tracking_id in week_entries:
                 # This is a duplicate - mark for deletion
                 duplicate_row_ids_set.add(row.id)
                 continue
             
             # Cross-source duplicate detection: check if same Work Request # exists for same week
-            if work_request_col_id and work_request_cell and work_request_cell.value:
-                work_request_value = str(work_request_cell.value).strip()
-                work_request_key = (work_request_value, week_end_cell.value)
+            if work_request_col_id and raw_work_request_value:
+                work_request_value = str(raw_work_request_value).strip()
+                work_request_key = (work_request_value, week_end_value)
                 
                 if work_request_key in work_request_week_map:
                     # Same Work Request # already exists for this week from another source
                     # Mark this row as duplicate (keep the first one seen)
                     duplicate_row_ids_set.add(row.id)
-                    print(f"  Cross-source duplicate: Work Request '{work_request_value}' for week {week_end_cell.value} - marking row {row.id} for deletion")
+                    logger.debug("  Cross-source duplicate: Work Request '%s' for week %s - marking row %s for deletion", work_request_value, week_end_value, row.id)
                     continue
                 else:
                     # First occurrence of this Work Request # for this week
-                    work_request_week_map[work_request_key] = row
+                    work_request_week_map[work_request_key] = row.id
             
             # First occurrence - keep this row
-            snapshot_map[composite_key] = row
-            existing_week_dates.add(week_end_cell.value)
+            week_entries[normalized_tracking_id] = (row.id, raw_work_request_value)
             
             # Track old-format entries for potential cleanup
             if is_old_format_tracking_id(normalized_tracking_id):
                 # Old format: tracking_id is just the row_id
-                old_format_key = (normalized_tracking_id, week_end_cell.value)
+                old_format_key = (normalized_tracking_id, week_end_value)
                 old_format_entries[old_format_key] = row.id
             else:
                 # New composite format: track for second pass and check against existing old entries
                 row_id_portion = extract_row_id_from_tracking_id(normalized_tracking_id)
-                new_composite_entries.append((row_id_portion, week_end_cell.value))
+                new_composite_entries.append((row_id_portion, week_end_value))
                 
                 # Check if there's an old-format entry to clean up
-                old_format_key = (row_id_portion, week_end_cell.value)
+                old_format_key = (row_id_portion, week_end_value)
                 if old_format_key in old_format_entries:
                     # Found an old-format entry that matches this new composite entry
                     old_row_id = old_format_entries[old_format_key]
                     if old_row_id not in duplicate_row_ids_set:
                         duplicate_row_ids_set.add(old_row_id)
-                        print(f"  Marking old-format tracking ID row for deletion: {old_row_id} (migrated to composite ID)")
+                        logger.debug("  Marking old-format tracking ID row for deletion: %s (migrated to composite ID)", old_row_id)
             
             # Only add non-duplicate rows to backfill list
-            if week_num_col_id and (week_num_cell is None or week_num_cell.value is None):
+            if week_num_col_id and row_values.get(week_num_col_id) is None:
                 rows_to_backfill.append({
                     'target_row_id': row.id,
-                    'week_ending_date_str': week_end_cell.value
+                    'week_ending_date_str': week_end_value
                 })
     
     # Second pass: Check for any new composite entries that match old-format entries in snapshot_map
     # This handles cases where the old entry was processed before the new entry in the loop
     for (row_id_portion, week_end_date) in new_composite_entries:
-        old_format_key = (row_id_portion, week_end_date)
-        if old_format_key in snapshot_map:
-            old_row = snapshot_map[old_format_key]
-            if old_row.id not in duplicate_row_ids_set:
-                duplicate_row_ids_set.add(old_row.id)
-                print(f"  Marking old-format tracking ID row for deletion: {old_row.id} (migrated to composite ID)")
+        old_format_entry = snapshot_map[week_end_date].get(row_id_portion)
+        if old_format_entry:
+            old_row_id = old_format_entry[0]
+            if old_row_id not in duplicate_row_ids_set:
+                duplicate_row_ids_set.add(old_row_id)
+                logger.debug("  Marking old-format tracking ID row for deletion: %s (migrated to composite ID)", old_row_id)
     
-    return snapshot_map, rows_to_backfill, existing_week_dates, list(duplicate_row_ids_set), work_request_week_map
+    return snapshot_map, rows_to_backfill, list(duplicate_row_ids_set), work_request_week_map
 
 # --- LOGIC HANDLERS ---
 
-def handle_snapshot_sync(smart, source_data_list, target_config):
+def handle_snapshot_sync(smart, all_source_rows, target_config, current_wed):
     """
     Handles snapshot synchronization for a target sheet.
     Supports multiple source sheets and historical backfill.
@@ -304,12 +543,29 @@ def handle_snapshot_sync(smart, source_data_list, target_config):
     
     Args:
         smart: Smartsheet client
-        source_data_list: List of tuples (source_sheet, source_config)
+        all_source_rows: Source rows from get_all_source_rows()
         target_config: Target sheet configuration
+        current_wed: Current week ending date, fixed once per run by main_process
     """
+    current_wed_str = current_wed.strftime('%Y-%m-%d')
+    sync_start_date = target_config.get('_sync_start_date')
+    sync_end_date = target_config.get('_sync_end_date')
+
+    # Check the target's date window before any API call, so targets that are
+    # not active this week cost nothing
+    if sync_start_date:
+        # With backfill enabled, use the later of the two dates (backfill start or sync start)
+        effective_start_date = max(HISTORICAL_BACKFILL_START_DATE, sync_start_date) if ENABLE_HISTORICAL_BACKFILL else sync_start_date
+        if current_wed < effective_start_date:
+            logger.info(f"Current week ending date ({current_wed_str}) is before effective start date ({effective_start_date}). Skipping sync for this target.")
+            return
+        if sync_end_date and current_wed > sync_end_date:
+            logger.info(f"Current week ending date ({current_wed_str}) is after sync end date ({sync_end_date}). Skipping sync for this target.")
+            return
+
     target_sheet_id = target_config['id']
-    target_sheet = smart.Sheets.get_sheet(target_sheet_id)
-    target_col_map = get_column_map_by_name(target_sheet)
+    batch_size = target_config.get('batch_size', MAX_ROWS_PER_REQUEST)
+    target_col_map = get_sheet_column_map(smart, target_sheet_id)
 
     # Resolve tracking and generated columns (support name or ID in config)
     tracking_col_id = resolve_column_id(target_config['tracking_column_name'], target_col_map)
@@ -317,393 +573,431 @@ def handle_snapshot_sync(smart, source_data_list, target_config):
     week_end_col_id = resolve_column_id(generated_cols_config.get('week_ending_date'), target_col_map)
     week_num_col_id = resolve_column_id(generated_cols_config.get('week_number'), target_col_map)
     
-    # Resolve Work Request column for cross-source deduplication
-    target_work_request_col = target_config.get('target_work_request_column')
-    if target_work_request_col is None:
-        # Fall back to first mapping in column_id_mapping
-        for src_col, tgt_col in target_config['column_id_mapping'].items():
-            target_work_request_col = resolve_column_id(tgt_col, target_col_map)
-            break
+    # Resolve Work Request column once; it is used for cross-source deduplication
+    # and as the value column for every snapshot row added or updated below
+    target_work_request_col = resolve_target_work_request_column(target_config, target_col_map)
 
     if not week_end_col_id:
-        print("WARNING: 'week_ending_date' not configured for this snapshot sheet. Halting snapshot logic.")
+        logger.warning("WARNING: 'week_ending_date' not configured for this snapshot sheet. Halting snapshot logic.")
         return
 
+    # Download only the columns the snapshot logic reads. Configured IDs that are
+    # not on the sheet are left out, since the API rejects unknown column IDs.
+    existing_col_ids = set(target_col_map.values())
+    needed_col_ids = [col_id for col_id in (tracking_col_id, week_end_col_id, week_num_col_id, target_work_request_col)
+                      if col_id in existing_col_ids]
+    target_sheet = call_with_retry(f"Loading target sheet {target_sheet_id}", smart.Sheets.get_sheet,
+                                   target_sheet_id, column_ids=needed_col_ids, exclude=SHEET_FETCH_EXCLUDE)
+
     # --- METADATA GATHERING (with cross-source deduplication) ---
-    target_snapshot_map, rows_needing_backfill, existing_week_dates, duplicate_row_ids, work_request_week_map = get_snapshot_metadata(
-        smart, target_sheet, tracking_col_id, week_end_col_id, week_num_col_id, target_work_request_col
+    snapshot_entries_by_week, rows_needing_backfill, duplicate_row_ids, work_request_week_map = get_snapshot_metadata(
+        target_sheet, tracking_col_id, week_end_col_id, week_num_col_id, target_work_request_col
     )
     
-    print(f"Found {len(work_request_week_map)} unique (Work Request #, Week) combinations in target sheet.")
+    logger.info(f"Found {len(work_request_week_map)} unique (Work Request #, Week) combinations in target sheet.")
     
     # --- DUPLICATE CLEANUP ---
     if duplicate_row_ids:
-        print(f"\nFound {len(duplicate_row_ids)} duplicate rows in target sheet.")
+        logger.info(f"\nFound {len(duplicate_row_ids)} duplicate rows in target sheet.")
         delete_duplicate_rows(smart, target_sheet_id, duplicate_row_ids)
-        print("Duplicate cleanup complete.\n")
+        logger.info("Duplicate cleanup complete.\n")
     
     # --- BACKFILL LOGIC ---
+    # Backfill updates are sent together with the snapshot updates further down
+    rows_to_update_backfill = []
     if rows_needing_backfill:
-        print(f"Found {len(rows_needing_backfill)} existing rows missing a week number. Preparing to backfill...")
-        rows_to_update_backfill = []
+        logger.info(f"Found {len(rows_needing_backfill)} existing rows missing a week number. Preparing to backfill...")
         
-        # Get sync start date filter if configured
-        sync_start_date_str = target_config.get('sync_start_date')
-        sync_end_date_str = target_config.get('sync_end_date')
-        sync_start_date = None
-        sync_end_date = None
-        if sync_start_date_str:
-            sync_start_date = datetime.strptime(sync_start_date_str, '%Y-%m-%d').date()
-            print(f"Backfill will respect date filter: only processing dates from {sync_start_date_str} onwards")
-        if sync_end_date_str:
-            sync_end_date = datetime.strptime(sync_end_date_str, '%Y-%m-%d').date()
-            print(f"Backfill will respect end date filter: only processing dates up to {sync_end_date_str}")
+        # The sync date filters read at the top of this function also bound the backfill
+        if sync_start_date:
+            logger.info(f"Backfill will respect date filter: only processing dates from {sync_start_date} onwards")
+        if sync_end_date:
+            logger.info(f"Backfill will respect end date filter: only processing dates up to {sync_end_date}")
         
+        # Backfill rows cluster on a few week ending dates, so parse each distinct one once
+        week_ending_by_str = {}
         for item in rows_needing_backfill:
             try:
-                historical_wed = datetime.strptime(item['week_ending_date_str'], '%Y-%m-%d').date()
+                historical_wed = week_ending_by_str.get(item['week_ending_date_str'])
+                if historical_wed is None:
+                    historical_wed = date.fromisoformat(item['week_ending_date_str'])
+                    week_ending_by_str[item['week_ending_date_str']] = historical_wed
                 
                 # Skip backfill if this date is before the sync start date
                 if sync_start_date and historical_wed < sync_start_date:
-                    print(f"  - Skipping backfill for {item['week_ending_date_str']} (before sync start date)")
+                    logger.debug("  - Skipping backfill for %s (before sync start date)", item['week_ending_date_str'])
                     continue
                 # Skip backfill if this date is after the sync end date
                 if sync_end_date and historical_wed > sync_end_date:
-                    print(f"  - Skipping backfill for {item['week_ending_date_str']} (after sync end date)")
+                    logger.debug("  - Skipping backfill for %s (after sync end date)", item['week_ending_date_str'])
                     continue
                 
                 historical_week_num = calculate_week_number(historical_wed)
-                update_row = smartsheet.models.Row({'id': item['target_row_id'], 'cells': [smartsheet.models.Cell({'column_id': week_num_col_id, 'value': historical_week_num})]})
+                update_row = {'id': item['target_row_id'], 'cells': [build_cell(week_num_col_id, historical_week_num)]}
                 rows_to_update_backfill.append(update_row)
             except ValueError:
-                print(f"  - WARNING: Could not parse date '{item['week_ending_date_str']}' for row ID {item['target_row_id']}. Skipping backfill for this row.")
+                logger.warning(f"  - WARNING: Could not parse date '{item['week_ending_date_str']}' for row ID {item['target_row_id']}. Skipping backfill for this row.")
         
         if rows_to_update_backfill:
-            print(f"Backfilling week numbers for {len(rows_to_update_backfill)} rows...")
-            smart.Sheets.update_rows(target_sheet_id, rows_to_update_backfill)
-            print("Successfully backfilled week numbers.")
+            logger.info(f"Prepared week number backfill for {len(rows_to_update_backfill)} rows (sent with the snapshot updates).")
 
     # --- MAIN SNAPSHOT LOGIC (ADD or UPDATE) ---
-    current_wed = get_current_week_ending_date()
-    current_week_num = calculate_week_number(current_wed)
-    current_wed_str = current_wed.strftime('%Y-%m-%d')
-
-    # Get all source rows with composite tracking IDs
-    all_source_rows = get_all_source_rows(source_data_list)
+    # Existing snapshot entries are indexed by week, so the week loops below need a
+    # single tracking-ID lookup per source row instead of a tuple key or a full scan
     total_source_rows = len(all_source_rows)
-    print(f"Total source rows across all source sheets: {total_source_rows}")
-
-    # Check if this target has a sync start date filter
-    sync_start_date_str = target_config.get('sync_start_date')
-    sync_end_date_str = target_config.get('sync_end_date')
-    weeks_to_process = [current_wed]  # Always process current week
+    logger.info(f"Total source rows across all source sheets: {total_source_rows}")
+
+    # Weeks are (date, 'YYYY-MM-DD' string, project week number) entries, in the
+    # same form as get_historical_week_table, so nothing is reformatted per week
+    current_week = (current_wed, current_wed_str, calculate_week_number(current_wed))
+    weeks_to_process = [current_week]  # Always process current week
+    # Historical week string -> tracking IDs missing from it, found by the completeness check
+    missing_tracking_ids_by_week = {}
     
     # Determine the earliest start date for historical backfill
-    if ENABLE_HISTORICAL_BACKFILL and sync_start_date_str:
-        backfill_start = datetime.strptime(HISTORICAL_BACKFILL_START, '%Y-%m-%d').date()
-        sync_start_date = datetime.strptime(sync_start_date_str, '%Y-%m-%d').date()
-        
-        # Use the later of the two dates (backfill start or sync start)
-        effective_start_date = max(backfill_start, sync_start_date)
-        
-        if current_wed < effective_start_date:
-            print(f"Current week ending date ({current_wed_str}) is before effective start date ({effective_start_date}). Skipping sync for this target.")
-            return
-        
-        if sync_end_date_str:
-            sync_end_date = datetime.strptime(sync_end_date_str, '%Y-%m-%d').date()
-            if current_wed > sync_end_date:
-                print(f"Current week ending date ({current_wed_str}) is after sync end date ({sync_end_date_str}). Skipping sync for this target.")
-                return
-            print(f"Date filter active: Syncing data from {effective_start_date} to {sync_end_date_str}. Current week ending: {current_wed_str}")
+    if ENABLE_HISTORICAL_BACKFILL and sync_start_date:
+        # The date window was already checked above
+        if sync_end_date:
+            logger.info(f"Date filter active: Syncing data from {effective_start_date} to {sync_end_date}. Current week ending: {current_wed_str}")
         else:
-            sync_end_date = None
-            print(f"Date filter active: Only syncing data from {effective_start_date} onwards. Current week ending: {current_wed_str}")
+            logger.info(f"Date filter active: Only syncing data from {effective_start_date} onwards. Current week ending: {current_wed_str}")
         
-        # Generate all missing weeks from effective start date to current week
-        # Find the first Sunday on or after the effective start date
-        first_sunday = effective_start_date
-        days_until_sunday = (6 - first_sunday.weekday() + 7) % 7
-        if days_until_sunday > 0:
-            first_sunday = first_sunday + timedelta(days=days_until_sunday)
-        
-        # Generate all Sundays (week ending dates) from first_sunday to current_wed
+        # Check every historical week (Sunday) from the effective start date to the current week
         missing_weeks = []
-        week_date = first_sunday
         
         # Pre-compute tracking IDs for performance
-        all_tracking_ids = set(normalize_tracking_id(composite_id) for _, composite_id, _ in all_source_rows)
+        all_tracking_ids = {composite_id for _, composite_id, _, _ in all_source_rows}
 
-        while week_date < current_wed and (sync_end_date is None or week_date <= sync_end_date):
-            week_date_str = week_date.strftime('%Y-%m-%d')
-            
-            # Count how many rows exist for this week using set intersection
-            week_snapshot_keys = set(tracking_id for (tracking_id, week) in target_snapshot_map.keys() if week == week_date_str)
-            existing_count = len(week_snapshot_keys)
+        for historical_week in get_historical_week_table(effective_start_date, current_wed, sync_end_date):
+            week_date_str = historical_week[1]
+            week_entries = snapshot_entries_by_week.get(week_date_str, {})
+            existing_count = len(week_entries)
             
-            # Check if this week has incomplete snapshot
-            if existing_count < total_source_rows:
-                print(f"  Week {week_date_str}: {existing_count}/{total_source_rows} rows exist - marking for backfill")
-                missing_weeks.append(week_date)
+            # A week is complete only if every current source row has a snapshot in it;
+            # one set operation per week instead of probing each source row
+            missing_tracking_ids = all_tracking_ids.difference(week_entries)
+            if missing_tracking_ids:
+                logger.info(f"  Week {week_date_str}: {existing_count}/{total_source_rows} rows exist, {len(missing_tracking_ids)} missing - marking for backfill")
+                missing_weeks.append(historical_week)
+                missing_tracking_ids_by_week[week_date_str] = missing_tracking_ids
             else:
-                print(f"  Week {week_date_str}: Complete ({existing_count}/{total_source_rows} rows)")
-            
-            week_date += timedelta(days=7)
+                logger.info(f"  Week {week_date_str}: Complete ({existing_count}/{total_source_rows} rows)")
         
         if missing_weeks:
-            print(f"\nFound {len(missing_weeks)} weeks with incomplete snapshots to backfill")
-            weeks_to_process = missing_weeks + [current_wed]
+            logger.info(f"\nFound {len(missing_weeks)} weeks with incomplete snapshots to backfill")
+            weeks_to_process = missing_weeks + [current_week]
         else:
-            print("\nNo missing weeks found - all historical data is complete")
-    elif sync_start_date_str:
-        # No historical backfill, just respect sync dates
-        sync_start_date = datetime.strptime(sync_start_date_str, '%Y-%m-%d').date()
-        if current_wed < sync_start_date:
-            print(f"Current week ending date ({current_wed_str}) is before sync start date ({sync_start_date_str}). Skipping sync for this target.")
-            return
-        
-        if sync_end_date_str:
-            sync_end_date = datetime.strptime(sync_end_date_str, '%Y-%m-%d').date()
-            if current_wed > sync_end_date:
-                print(f"Current week ending date ({current_wed_str}) is after sync end date ({sync_end_date_str}). Skipping sync for this target.")
-                return
+            logger.info("\nNo missing weeks found - all historical data is complete")
 
-    print(f"\nProcessing {len(weeks_to_process)} week(s): {[w.strftime('%Y-%m-%d') for w in weeks_to_process]}")
-    print(f"Found {len(target_snapshot_map)} existing snapshot entries in target.")
+    logger.info(f"\nProcessing {len(weeks_to_process)} week(s): {[week_str for _, week_str, _ in weeks_to_process]}")
+    logger.info(f"Found {sum(map(len, snapshot_entries_by_week.values()))} existing snapshot entries in target.")
 
     all_rows_to_add = []
     all_rows_to_update = []
 
-    for week_ending_date in weeks_to_process:
-        week_ending_str = week_ending_date.strftime('%Y-%m-%d')
-        week_num = calculate_week_number(week_ending_date)
-        
-        print(f"\n--- Processing Week Ending: {week_ending_str} (Project Week: {week_num}) ---")
+    # Everything derived from a source row is week-independent, so compute it once
+    # here instead of once per processed week
+    source_entries = []
+    source_entry_positions = {}
+    for source_row, composite_tracking_id, source_config, source_values in all_source_rows:
+        # Get the work request value for cross-source deduplication
+        source_value = source_values.get(source_config['work_request_column_id'])
+        source_value_str = str(source_value).strip() if source_value else ""
+        source_entry_positions[composite_tracking_id] = len(source_entries)
+        source_entries.append((composite_tracking_id, source_value, source_value_str))
+
+    for week_ending_date, week_ending_str, week_num in weeks_to_process:
+        logger.info(f"\n--- Processing Week Ending: {week_ending_str} (Project Week: {week_num}) ---")
         
         rows_to_add = []
         rows_to_update = []
-
-        for source_row, composite_tracking_id, source_config in all_source_rows:
-            normalized_tracking_id = normalize_tracking_id(composite_tracking_id)
-            composite_key = (normalized_tracking_id, week_ending_str)
-            
-            # Get the work request value for cross-source deduplication
-            source_work_request_col_id = source_config['work_request_column_id']
-            source_cell = source_row.get_column(source_work_request_col_id)
-            source_value = source_cell.value if source_cell else None
-            source_value_str = str(source_value).strip() if source_value else ""
+        skipped_duplicate_count = 0
+        week_entries = snapshot_entries_by_week.get(week_ending_str, {})
+
+        # --- UPDATE LOGIC (only for current week) ---
+        # Rows of historical weeks are never modified, so only the current week
+        # needs a pass over the rows that already exist
+        if week_ending_date == current_wed and target_work_request_col:
+            for composite_tracking_id, source_value, _ in source_entries:
+                existing_entry = week_entries.get(composite_tracking_id)
+                if existing_entry is None:
+                    continue
+                target_row_id, target_value = existing_entry
+                # The payload is only built once a difference is found
+                if canonicalize_value(source_value) != canonicalize_value(target_value):
+                    update_value = source_value if source_value is not None else ""
+                    logger.debug("  - Updating snapshot for tracking ID %s. Value changed from '%s' to '%s'.", composite_tracking_id, target_value, source_value)
+                    rows_to_update.append({'id': target_row_id, 'cells': [build_cell(target_work_request_col, update_value)]})
+
+        # --- ADD LOGIC (for all missing weeks) ---
+        # Backfilled weeks only visit the source rows the completeness check found
+        # missing, kept in source order so cross-source deduplication is unchanged
+        missing_tracking_ids = missing_tracking_ids_by_week.get(week_ending_str)
+        if missing_tracking_ids is None:
+            add_candidates = source_entries
+        else:
+            missing_positions = sorted(source_entry_positions[tracking_id] for tracking_id in missing_tracking_ids)
+            add_candidates = [source_entries[position] for position in missing_positions]
+        for composite_tracking_id, source_value, source_value_str in add_candidates:
+            if composite_tracking_id in week_entries:
+                continue
             
-            # Create work request key for cross-source duplicate check
+            # Cross-source deduplication: skip if this Work Request # already exists for this week.
+            # The key is only built here, since rows already present never need it.
             work_request_key = (source_value_str, week_ending_str) if source_value_str else None
+            if work_request_key and work_request_key in work_request_week_map:
+                logger.debug("  - Skipping duplicate Work Request '%s' for week %s (already exists from another source)", source_value_str, week_ending_str)
+                skipped_duplicate_count += 1
+                continue
             
-            if composite_key in target_snapshot_map:
-                # --- UPDATE LOGIC (only for current week) ---
-                if week_ending_date == current_wed:
-                    target_row = target_snapshot_map[composite_key]
-                    update_row = smartsheet.models.Row({'id': target_row.id, 'cells': []})
-                    needs_update = False
-                    
-                    # Get target work request column
-                    target_work_request_col_resolved = target_config.get('target_work_request_column')
-                    if target_work_request_col_resolved is None:
-                        # Fall back to first mapping in column_id_mapping
-                        for src_col, tgt_col in target_config['column_id_mapping'].items():
-                            target_work_request_col_resolved = resolve_column_id(tgt_col, target_col_map)
-                            break
-                    
-                    if target_work_request_col_resolved:
-                        target_cell = target_row.get_column(target_work_request_col_resolved)
-                        target_value = target_cell.value if target_cell else None
-
-                        if source_value != target_value:
-                            update_value = source_value if source_value is not None else ""
-                            print(f"  - Updating snapshot for tracking ID {composite_tracking_id}. Value changed from '{target_value}' to '{source_value}'.")
-                            needs_update = True
-                            update_row.cells.append(smartsheet.models.Cell({'column_id': target_work_request_col_resolved, 'value': update_value}))
-                    
-                    if needs_update:
-                        rows_to_update.append(update_row)
-                # Historical weeks already exist, skip them
-            else:
-                # --- ADD LOGIC (for all missing weeks) ---
-                
-                # Cross-source deduplication: skip if this Work Request # already exists for this week
-                if work_request_key and work_request_key in work_request_week_map:
-                    print(f"  - Skipping duplicate Work Request '{source_value_str}' for week {week_ending_str} (already exists from another source)")
-                    continue
-                
-                print(f"  - Preparing new snapshot for tracking ID: {composite_tracking_id}")
-                new_row = smartsheet.models.Row({'to_bottom': True, 'cells': []})
-                
-                # Get target work request column
-                target_work_request_col_resolved = target_config.get('target_work_request_column')
-                if target_work_request_col_resolved is None:
-                    # Fall back to first mapping in column_id_mapping
-                    for src_col, tgt_col in target_config['column_id_mapping'].items():
-                        target_work_request_col_resolved = resolve_column_id(tgt_col, target_col_map)
-                        break
-                
-                if target_work_request_col_resolved:
-                    # Ensure we always have a valid value (convert None to empty string)
-                    cell_value = source_value if source_value is not None else ""
-                    new_row.cells.append(smartsheet.models.Cell({'column_id': target_work_request_col_resolved, 'value': cell_value}))
-                
-                new_row.cells.append(smartsheet.models.Cell({'column_id': tracking_col_id, 'value': composite_tracking_id}))
-                new_row.cells.append(smartsheet.models.Cell({'column_id': week_end_col_id, 'value': week_ending_str}))
-                
-                if week_num_col_id:
-                    new_row.cells.append(smartsheet.models.Cell({'column_id': week_num_col_id, 'value': week_num}))
-                
-                rows_to_add.append(new_row)
-                
-                # Track this work request so we don't add it again from another source in this run
-                if work_request_key:
-                    work_request_week_map[work_request_key] = True
+            logger.debug("  - Preparing new snapshot for tracking ID: %s", composite_tracking_id)
+            new_row = {'toBottom': True, 'cells': []}
+            
+            if target_work_request_col:
+                # Ensure we always have a valid value (convert None to empty string)
+                cell_value = source_value if source_value is not None else ""
+                new_row['cells'].append(build_cell(target_work_request_col, cell_value))
+            
+            new_row['cells'].append(build_cell(tracking_col_id, composite_tracking_id))
+            new_row['cells'].append(build_cell(week_end_col_id, week_ending_str))
+            
+            if week_num_col_id:
+                new_row['cells'].append(build_cell(week_num_col_id, week_num))
+            
+            rows_to_add.append(new_row)
+            
+            # Track this work request so we don't add it again from another source in this run
+            if work_request_key:
+                work_request_week_map[work_request_key] = True
 
         all_rows_to_add.extend(rows_to_add)
         all_rows_to_update.extend(rows_to_update)
         
         if rows_to_add:
-            print(f"  - Will create {len(rows_to_add)} new snapshot rows for week {week_ending_str}")
+            logger.info(f"  - Will create {len(rows_to_add)} new snapshot rows for week {week_ending_str}")
         if rows_to_update:
-            print(f"  - Will update {len(rows_to_update)} existing snapshot rows for week {week_ending_str}")
+            logger.info(f"  - Will update {len(rows_to_update)} existing snapshot rows for week {week_ending_str}")
+        if skipped_duplicate_count:
+            logger.info(f"  - Skipped {skipped_duplicate_count} Work Requests already present from another source for week {week_ending_str}")
 
     # --- BATCH OPERATIONS ---
+    if rows_to_update_backfill:
+        # One update request set for backfill and snapshot changes; a row that needs
+        # both is sent once with both cells
+        merged_updates = {}
+        for update_row in rows_to_update_backfill + all_rows_to_update:
+            if update_row['id'] in merged_updates:
+                merged_updates[update_row['id']]['cells'].extend(update_row['cells'])
+            else:
+                merged_updates[update_row['id']] = update_row
+        all_rows_to_update = list(merged_updates.values())
+
     if all_rows_to_update:
-        print(f"\nUpdating {len(all_rows_to_update)} existing snapshot rows with current data...")
-        smart.Sheets.update_rows(target_sheet_id, all_rows_to_update)
-        print("Successfully updated rows.")
+        logger.info(f"\nUpdating {len(all_rows_to_update)} existing snapshot rows with current data...")
+        write_rows_in_batches(smart.Sheets.update_rows, target_sheet_id, all_rows_to_update, batch_size)
+        logger.info("Successfully updated rows.")
 
     if all_rows_to_add:
-        print(f"\nCreating {len(all_rows_to_add)} new snapshot rows...")
-        
-        # Process in batches of 500 to avoid API limits and timeouts
-        batch_size = 500
-        total_batches = (len(all_rows_to_add) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(all_rows_to_add), batch_size):
-            batch = all_rows_to_add[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            print(f"  Processing batch {batch_num}/{total_batches} ({len(batch)} rows)...")
-            smart.Sheets.add_rows(target_sheet_id, batch)
-            print(f"  Batch {batch_num} completed successfully.")
-        
-        print("Successfully created all snapshot rows.")
+        logger.info(f"\nCreating {len(all_rows_to_add)} new snapshot rows...")
+        write_rows_in_batches(smart.Sheets.add_rows, target_sheet_id, all_rows_to_add, batch_size, idempotent=False)
+        logger.info("Successfully created all snapshot rows.")
     else:
-        print("\nNo new snapshot rows to create.")
+        logger.info("\nNo new snapshot rows to create.")
 
-def handle_update_sync(smart, source_sheet, target_config):
-    # This function remains unchanged.
+def handle_update_sync(smart, source_rows, target_config):
+    """
+    Handles one-way update synchronization for a target sheet.
+    Rows are matched on the tracking column (source row ID); changed mapped cells
+    are updated and source rows with no target row yet are added.
+    
+    Args:
+        smart: Smartsheet client
+        source_rows: (source_row, {column_id: value}) pairs of the primary source sheet
+        target_config: Target sheet configuration
+    """
     target_sheet_id = target_config['id']
-    target_sheet = smart.Sheets.get_sheet(target_sheet_id)
-    target_col_map = get_column_map_by_name(target_sheet)
+    batch_size = target_config.get('batch_size', MAX_ROWS_PER_REQUEST)
+    target_col_map = get_sheet_column_map(smart, target_sheet_id)
     tracking_col_id = target_col_map[target_config['tracking_column_name']]
-    column_mapping = target_config['column_id_mapping']
+    existing_col_ids = set(target_col_map.values())
+    # Resolve the mapping into (source_column_id, target_column_id) pairs once;
+    # it is iterated for every source row below. Target columns may be given by
+    # name or ID, and entries whose column is missing from the sheet are skipped.
+    column_mapping = []
+    for src_id, tgt_ref in target_config['column_id_mapping'].items():
+        tgt_id = resolve_column_id(tgt_ref, target_col_map)
+        if tgt_id not in existing_col_ids:
+            logger.warning(f"WARNING: Target column '{tgt_ref}' not found. Skipping it in the mapping.")
+            continue
+        column_mapping.append((src_id, tgt_id))
+    column_mapping = tuple(column_mapping)
+    # Optional digest column: rows whose stored digest matches the source skip the cell compare
+    hash_col_id = None
+    if target_config.get('content_hash_column'):
+        hash_col_id = resolve_column_id(target_config['content_hash_column'], target_col_map)
+        if hash_col_id not in existing_col_ids:
+            hash_col_id = None
+            logger.warning(f"WARNING: Content hash column '{target_config['content_hash_column']}' not found. Comparing every cell.")
     
-    target_row_map = get_target_row_map_for_update(smart, target_sheet, tracking_col_id)
-    print(f"Found {len(target_row_map)} existing rows to check for updates.")
+    needed_col_ids = {tgt_id for _, tgt_id in column_mapping}
+    if hash_col_id:
+        needed_col_ids.add(hash_col_id)
+    # Download only the tracking column and the columns that are diffed; all of
+    # them were checked against the sheet above, since the API rejects unknown IDs
+    fetch_col_ids = [tracking_col_id] + list(needed_col_ids)
+    target_sheet = call_with_retry(f"Loading target sheet {target_sheet_id}", smart.Sheets.get_sheet,
+                                   target_sheet_id, column_ids=fetch_col_ids, exclude=SHEET_FETCH_EXCLUDE)
+    target_row_map = get_target_row_map_for_update(target_sheet, tracking_col_id, needed_col_ids)
+    del target_sheet  # the slim map is all the diff needs; let the SDK objects be collected
+    logger.info(f"Found {len(target_row_map)} existing rows to check for updates.")
 
     rows_to_add, rows_to_update = [], []
-    for source_row in source_sheet.rows:
+    # Per-row detail is summarized in these counters and logged once below
+    changed_cells_by_column = collections.Counter()
+    unchanged_hash_count = 0
+    skipped_empty_count = 0
+    for source_row, source_values in source_rows:
+        content_hash = compute_content_hash(source_values, column_mapping) if hash_col_id else None
         if source_row.id in target_row_map:
-            target_row = target_row_map[source_row.id]
-            row_to_update = smartsheet.models.Row({'id': target_row.id, 'cells': []})
-            has_changed = False
-            for src_id, tgt_id in column_mapping.items():
-                src_val = (source_row.get_column(src_id).value if source_row.get_column(src_id) else None)
-                tgt_val = (target_row.get_column(tgt_id).value if target_row.get_column(tgt_id) else None)
-                if src_val != tgt_val:
-                    has_changed = True
-                    row_to_update.cells.append(smartsheet.models.Cell({'column_id': tgt_id, 'value': src_val}))
-            if has_changed:
-                rows_to_update.append(row_to_update)
+            target_row_id, target_values = target_row_map[source_row.id]
+            if hash_col_id and target_values.get(hash_col_id) == content_hash:
+                unchanged_hash_count += 1
+                continue
+            # Collect the differences first; the payload is only built for changed rows
+            changed_cells = [(tgt_id, source_values.get(src_id)) for src_id, tgt_id in column_mapping
+                             if canonicalize_value(source_values.get(src_id)) != canonicalize_value(target_values.get(tgt_id))]
+            if hash_col_id:
+                # Digest was missing or stale; store it so the next run can skip this row
+                changed_cells.append((hash_col_id, content_hash))
+            if changed_cells:
+                changed_cells_by_column.update(tgt_id for tgt_id, _ in changed_cells)
+                rows_to_update.append({'id': target_row_id, 'cells': [build_cell(tgt_id, value) for tgt_id, value in changed_cells]})
         else:
-            new_row = smartsheet.models.Row({'to_top': True, 'cells': []})
-            for src_id, tgt_id in column_mapping.items():
-                src_cell = source_row.get_column(src_id)
-                new_row.cells.append(smartsheet.models.Cell({'column_id': tgt_id, 'value': (src_cell.value if src_cell else "") or ""}))
-            new_row.cells.append(smartsheet.models.Cell({'column_id': tracking_col_id, 'value': source_row.id}))
+            # A source row with no mapped data would only add a blank row with a tracking ID;
+            # it is picked up on a later run once it has values
+            if all(canonicalize_value(source_values.get(src_id)) is None for src_id, _ in column_mapping):
+                skipped_empty_count += 1
+                continue
+            new_row = {'toTop': True, 'cells': [build_cell(tgt_id, source_values.get(src_id) or "")
+                                                for src_id, tgt_id in column_mapping]}
+            new_row['cells'].append(build_cell(tracking_col_id, source_row.id))
+            if hash_col_id:
+                new_row['cells'].append(build_cell(hash_col_id, content_hash))
             rows_to_add.append(new_row)
 
+    if unchanged_hash_count:
+        logger.info(f"Skipped {unchanged_hash_count} rows whose content hash is unchanged.")
+    if skipped_empty_count:
+        logger.info(f"Skipped {skipped_empty_count} new source rows with no mapped data.")
     if rows_to_update:
-        print(f"Found {len(rows_to_update)} rows with changes. Updating...")
-        smart.Sheets.update_rows(target_sheet_id, rows_to_update)
+        logger.info(f"Found {len(rows_to_update)} rows with changes. Updating...")
+        logger.info(f"Changed cells by target column ID: {dict(changed_cells_by_column)}")
+        write_rows_in_batches(smart.Sheets.update_rows, target_sheet_id, rows_to_update, batch_size)
     else:
-        print("No updates needed for existing rows.")
+        logger.info("No updates needed for existing rows.")
 
     if rows_to_add:
-        print(f"Found {len(rows_to_add)} new rows to add. Adding...")
-        smart.Sheets.add_rows(target_sheet_id, rows_to_add)
+        logger.info(f"Found {len(rows_to_add)} new rows to add. Adding...")
+        write_rows_in_batches(smart.Sheets.add_rows, target_sheet_id, rows_to_add, batch_size, idempotent=False)
     else:
-        print("No new rows to add.")
+        logger.info("No new rows to add.")
 
 # --- MAIN DISPATCHER ---
 
+def _process_target(smart, all_source_rows, primary_source_rows, target_config, current_wed):
+    """
+    Syncs a single target sheet. Errors are reported and swallowed so that one
+    failing target never stops the others.
+    """
+    # Name the worker thread after the target so interleaved log lines from
+    # parallel targets can be told apart (see the log format in __main__)
+    current_thread = threading.current_thread()
+    previous_thread_name = current_thread.name
+    current_thread.name = f"target-{target_config['id']}"
+    sync_mode = target_config.get('sync_mode', 'update')
+    logger.info(f"\n{'='*80}")
+    logger.info(f"Processing target: '{target_config['description']}' (ID: {target_config['id']})")
+    logger.info(f"Sync mode: '{sync_mode}'")
+    logger.info(f"{'='*80}")
+    
+    try:
+        if sync_mode == 'snapshot':
+            handle_snapshot_sync(smart, all_source_rows, target_config, current_wed)
+        elif sync_mode == 'update':
+            # Update mode still uses single source (first source or legacy). With no
+            # primary rows (empty sheet or failed load) there is nothing to sync.
+            if primary_source_rows:
+                handle_update_sync(smart, primary_source_rows, target_config)
+            else:
+                logger.warning(f"WARNING: No primary source rows available for update mode. Skipping target.")
+        else:
+            logger.warning(f"WARNING: Unknown sync_mode '{sync_mode}'. Skipping target.")
+    except Exception as e:
+        # The failure may come from a stale column layout; re-read it next time
+        invalidate_sheet_column_map(target_config['id'])
+        logger.exception(f"ERROR processing target {target_config['id']}. Error: {e}")
+    finally:
+        current_thread.name = previous_thread_name
+
 def main_process(smart, config):
-    print("--- Starting Sync Process ---")
+    logger.info("--- Starting Sync Process ---")
     
-    # Check if we have multi-source configuration
+    # config.py normalizes the legacy single 'source_sheet_id' form into
+    # 'source_sheets' at import, so only the list form is handled here
     source_sheets_config = config.get('source_sheets')
-    legacy_source_sheet_id = config.get('source_sheet_id')
+    if not source_sheets_config:
+        logger.error("FATAL ERROR: No source sheet configuration found. Halting.")
+        return
     
     # Load source data
-    source_data_list = []
-    if source_sheets_config:
-        print(f"Loading {len(source_sheets_config)} source sheets...")
-        source_data_list = load_all_source_data(smart, source_sheets_config)
-        if not source_data_list:
-            print("FATAL ERROR: Could not load any source sheets. Halting.")
-            return
-    elif legacy_source_sheet_id:
-        # Legacy single source mode for update targets
-        try:
-            source_sheet = smart.Sheets.get_sheet(legacy_source_sheet_id)
-            print(f"Successfully loaded legacy source sheet: '{source_sheet.name}' with {len(source_sheet.rows)} rows.")
-            # Create a dummy config for legacy mode
-            # Note: work_request_column_id is None because update mode uses column_id_mapping
-            # from the target config rather than source config work_request_column_id
-            legacy_config = {
-                'id': legacy_source_sheet_id,
-                'description': 'Legacy Source Sheet',
-                'work_request_column_id': None  # Only used in snapshot mode with multi-source
-            }
-            source_data_list = [(source_sheet, legacy_config)]
-        except Exception as e:
-            print(f"FATAL ERROR: Could not load source sheet. Halting. Error: {e}")
-            return
-    else:
-        print("FATAL ERROR: No source sheet configuration found. Halting.")
+    logger.info(f"Loading {len(source_sheets_config)} source sheets...")
+    source_data_list = load_all_source_data(smart, source_sheets_config)
+    if not source_data_list:
+        logger.error("FATAL ERROR: Could not load any source sheets. Halting.")
         return
 
-    for target_config in config['targets']:
-        sync_mode = target_config.get('sync_mode', 'update')
-        print(f"\n{'='*80}")
-        print(f"Processing target: '{target_config['description']}' (ID: {target_config['id']})")
-        print(f"Sync mode: '{sync_mode}'")
-        print(f"{'='*80}")
-        
-        try:
-            if sync_mode == 'snapshot':
-                handle_snapshot_sync(smart, source_data_list, target_config)
-            elif sync_mode == 'update':
-                # Update mode still uses single source (first source or legacy)
-                source_sheet = source_data_list[0][0] if source_data_list else None
-                if source_sheet:
-                    handle_update_sync(smart, source_sheet, target_config)
-                else:
-                    print(f"WARNING: No source sheet available for update mode. Skipping target.")
-            else:
-                print(f"WARNING: Unknown sync_mode '{sync_mode}'. Skipping target.")
-        except Exception as e:
-            print(f"ERROR processing target {target_config['id']}. Error: {e}")
-            import traceback
-            traceback.print_exc()
+    # Index every source row once; the per-target handlers only read these
+    all_source_rows = get_all_source_rows(source_data_list, SOURCE_COLUMN_IDS)
+    # The primary source is the first configured one, even if it failed to load;
+    # update targets must never fall back to another source's rows
+    primary_source_config = source_sheets_config[0]
+    primary_source_rows = [(row, row_values) for row, _, source_config, row_values in all_source_rows
+                           if source_config is primary_source_config]
 
-    print("\n" + "="*80)
-    print("--- Sync Process Complete ---")
-    print("="*80)
+    # Every target snapshots the same week, even if the run crosses midnight
+    current_wed = get_current_week_ending_date()
+
+    targets = config['targets']
+    max_workers = min(MAX_PARALLEL_TARGETS, len(targets)) or 1
+    if max_workers == 1:
+        for target_config in targets:
+            _process_target(smart, all_source_rows, primary_source_rows, target_config, current_wed)
+    else:
+        # Each target writes only to its own sheet, so targets can run side by side
+        logger.info(f"Syncing {len(targets)} targets with up to {max_workers} in parallel...")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='target') as executor:
+            futures = [executor.submit(_process_target, smart, all_source_rows, primary_source_rows, target_config, current_wed)
+                       for target_config in targets]
+            for future in as_completed(futures):
+                future.result()
+
+    logger.info("\n" + "="*80)
+    logger.info("--- Sync Process Complete ---")
+    logger.info("="*80)
 
 if __name__ == '__main__':
+    # Per-row detail is logged at DEBUG and suppressed by default; set LOG_LEVEL=DEBUG
+    # to see it. With parallel targets every line is prefixed with its worker thread,
+    # named after the target.
+    # Only this module's logger is configured: the root logger stays unset so the
+    # Smartsheet SDK keeps its request/response logging (full sheet payloads) off.
+    log_format = '[%(threadName)s] %(message)s' if MAX_PARALLEL_TARGETS > 1 else '%(message)s'
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter(log_format))
+    logger.addHandler(log_handler)
+    logger.propagate = False  # no second copy if the SDK's LOG_CFG option sets up the root logger
+    logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').strip().upper())
+
     access_token = os.getenv('SMARTSHEET_ACCESS_TOKEN')
     if not access_token:
         raise ValueError("FATAL ERROR: SMARTSHEET_ACCESS_TOKEN environment variable not found.")